@@ -1,43 +1,53 @@
 # Copyright (c) Microsoft Corporation.
 # SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
 
-from io import StringIO
+from array import array
 from pathlib import Path
-from dataclasses import dataclass, field
-from typing import Optional
-import re
+from operator import attrgetter
+from typing import Iterable, Optional
 
 
-@dataclass
 class PropertyRange:
-    lower: int = -1
-    upper: int = -1
-    prop: str = None
+    __slots__ = ("lower", "upper", "prop")
+
+    def __init__(self, lower: int = -1, upper: int = -1, prop: str = None):
+        self.lower = lower
+        self.upper = upper
+        self.prop = prop
 
 
-@dataclass
 class PropertyTable:
-    lower_bounds: list[int] = field(default_factory=list)
-    props_and_range: list[int] = field(default_factory=list)
-
-
-LINE_REGEX = re.compile(
-    r"^(?P<lower>[0-9A-F]{4,5})(?:\.\.(?P<upper>[0-9A-F]{4,5}))?\s*;\s*(?P<prop>\w+)")
-
-def parse_property_line(inputLine: str) -> Optional[PropertyRange]:
-    result = PropertyRange()
-    if m := LINE_REGEX.match(inputLine):
-        lower_str, upper_str, result.prop = m.group("lower", "upper", "prop")
-        result.lower = int(lower_str, base=16)
-        result.upper = result.lower
-        if upper_str is not None:
-            result.upper = int(upper_str, base=16)
-        return result
-    else:
+    __slots__ = ("lower_bounds", "props_and_range")
+
+    def __init__(self, lower_bounds: array, props_and_range: array):
+        self.lower_bounds = lower_bounds
+        self.props_and_range = props_and_range
+
+
+def parse_property_line(inputLine: bytes) -> Optional[PropertyRange]:
+    """
+    Parses one line of the form "XXXX(..YYYY)? ; Property # comment".
+
+    Returns None for blank lines and comment lines.
+    """
+    line = inputLine.lstrip()
+    if not line or line.startswith(b"#"):
         return None
+    head, semi, rest = line.partition(b";")
+    if not semi:
+        return None
+    head = head.rstrip()
+    sep = head.find(b"..")
+    if sep == -1:
+        lower = upper = int(head, base=16)
+    else:
+        lower = int(head[:sep], base=16)
+        upper = int(head[sep + 2:], base=16)
+    prop = rest.partition(b"#")[0].strip().decode("ascii")
+    return PropertyRange(lower, upper, prop)
 
 
-def compact_property_ranges(input: list[PropertyRange]) -> list[PropertyRange]:
+def compact_property_ranges(input: Iterable[PropertyRange]) -> list[PropertyRange]:
     """
     Merges consecutive ranges with the same property to one range.
 
@@ -45,18 +55,33 @@ def compact_property_ranges(input: list[PropertyRange]) -> list[PropertyRange]:
     reducing binary size and improving lookup performance.
     """
     result = list()
+    last = None
     for x in input:
         if (
-            len(result)
-            and result[-1].prop == x.prop
-            and result[-1].upper + 1 == x.lower
+            last is not None
+            and last.prop == x.prop
+            and last.upper + 1 == x.lower
         ):
-            result[-1].upper = x.upper
+            last.upper = x.upper
             continue
         result.append(x)
+        last = x
     return result
 
 
+def parse_and_compact(input: Iterable[bytes], prop: Optional[str] = None) -> list[PropertyRange]:
+    """
+    Parses and compacts the ranges of a UCD file in a single pass,
+    without materializing the uncompacted ranges.
+
+    If prop is given, only ranges with that property are kept.
+    """
+    ranges = filter(None, map(parse_property_line, input))
+    if prop is not None:
+        ranges = (x for x in ranges if x.prop == prop)
+    return compact_property_ranges(ranges)
+
+
 PROP_VALUE_ENUMERATOR_TEMPLATE = "_{}_value"
 PROP_VALUE_ENUM_TEMPLATE = """
 {filename}
@@ -65,7 +90,7 @@ enum class _{prop_name}_property_values : uint8_t {{
     {enumerators},
     _No_value = 255
 }};
-"""
+""".lstrip()
 
 DATA_ARRAY_TEMPLATE = """
 {filename}
@@ -74,7 +99,7 @@ inline constexpr _Unicode_property_data<_{prop_name}_property_values, {size}> _{
     {{{lower_bounds}}},
     {{{props_and_size}}}
 }};
-"""
+""".lstrip()
 
 MSVC_FORMAT_UCD_TABLES_HPP_TEMPLATE = """
 // __msvc_format_ucd_tables.hpp internal header
@@ -213,33 +238,46 @@ _STL_RESTORE_CLANG_WARNINGS
 
 #endif // _STL_COMPILER_PREPROCESSOR
 #endif // __MSVC_FORMAT_UCD_TABLES_HPP
-"""
+""".lstrip()
 
 def property_ranges_to_table(ranges: list[PropertyRange], props: list[str]) -> PropertyTable:
-    result = PropertyTable()
-    for range in sorted(ranges, key=lambda x: x.lower):
-        result.lower_bounds.append(range.lower)
+    n = len(ranges)
+    lower_bounds = array('I', [0]) * n
+    props_and_range = array('H', [0]) * n
+    prop_idx_map = {prop: idx for idx, prop in enumerate(props)}
+    for i, range in enumerate(sorted(ranges, key=attrgetter("lower"))):
+        lower_bounds[i] = range.lower
         size = (range.upper - range.lower) + 1
         assert size <= 0x0FFF
-        prop_idx = props.index(range.prop)
-        result.props_and_range.append(size | (prop_idx << 12))
-    return result
+        prop_idx = prop_idx_map[range.prop]
+        props_and_range[i] = size | (prop_idx << 12)
+    return PropertyTable(lower_bounds, props_and_range)
 
 
 def generate_cpp_data(filename: str, timestamp: str, prop_name: str, ranges: list[PropertyRange]) -> str:
-    result = StringIO()
-    prop_values = sorted(set(x.prop for x in ranges))
+    prop_values = sorted({x.prop for x in ranges})
     table = property_ranges_to_table(ranges, prop_values)
     enumerator_values = [PROP_VALUE_ENUMERATOR_TEMPLATE.format(
         x) for x in prop_values]
-    result.write(PROP_VALUE_ENUM_TEMPLATE.lstrip().format(
-        filename=filename, timestamp=timestamp, prop_name=prop_name, enumerators=",".join(enumerator_values)))
-    result.write("\n")
-    result.write(DATA_ARRAY_TEMPLATE.lstrip().format(filename=filename, timestamp=timestamp, prop_name=prop_name,
+    prop_value_enum = PROP_VALUE_ENUM_TEMPLATE.format(
+        filename=filename, timestamp=timestamp, prop_name=prop_name, enumerators=",".join(enumerator_values))
+    data_array = DATA_ARRAY_TEMPLATE.format(filename=filename, timestamp=timestamp, prop_name=prop_name,
                  size=len(table.lower_bounds),
-                 lower_bounds=",".join(["0x" + format(x, 'x') for x in table.lower_bounds]),
-                 props_and_size=",".join(["0x" + format(x, 'x') for x in table.props_and_range])))
-    return result.getvalue()
+                 lower_bounds=",".join(map(hex, table.lower_bounds)),
+                 props_and_size=",".join(map(hex, table.props_and_range)))
+    return f"{prop_value_enum}\n{data_array}"
+
+
+def load_property_file(path: Path, prop: Optional[str] = None) -> tuple[str, str, list[PropertyRange]]:
+    """
+    Reads the filename and timestamp header lines and the compacted
+    property ranges from one UCD file, optionally restricted to one property.
+    """
+    with path.open('rb') as f:
+        filename = f.readline().decode('utf-8').replace("#", "//").rstrip()
+        timestamp = f.readline().decode('utf-8').replace("#", "//").rstrip()
+        ranges = parse_and_compact(f, prop)
+    return filename, timestamp, ranges
 
 
 def generate_data_tables() -> str:
@@ -257,25 +295,12 @@ def generate_data_tables() -> str:
     """
     gbp_data_path = Path(__file__).absolute().with_name("GraphemeBreakProperty.txt")
     emoji_data_path = Path(__file__).absolute().with_name("emoji-data.txt")
-    gbp_filename = ""
-    gbp_timestamp = ""
-    emoji_filename = ""
-    emoji_timestamp = ""
-    gbp_ranges = list()
-    emoji_ranges = list()
-    with gbp_data_path.open(encoding='utf-8') as f:
-        gbp_filename = f.readline().replace("#", "//").rstrip()
-        gbp_timestamp = f.readline().replace("#", "//").rstrip()
-        gbp_ranges = compact_property_ranges([x for line in f if (x := parse_property_line(line))])
-    with emoji_data_path.open(encoding='utf-8') as f:
-        emoji_filename = f.readline().replace("#", "//").rstrip()
-        emoji_timestamp = f.readline().replace("#", "//").rstrip()
-        emoji_ranges = compact_property_ranges([x for line in f if (x := parse_property_line(line))])
+    gbp_filename, gbp_timestamp, gbp_ranges = load_property_file(gbp_data_path)
+    emoji_filename, emoji_timestamp, emoji_ranges = load_property_file(emoji_data_path, "Extended_Pictographic")
     gpb_cpp_data = generate_cpp_data(gbp_filename, gbp_timestamp, "Grapheme_Break", gbp_ranges)
-    emoji_cpp_data = generate_cpp_data(emoji_filename, emoji_timestamp, "Extended_Pictographic", [
-        x for x in emoji_ranges if x.prop == "Extended_Pictographic"])
+    emoji_cpp_data = generate_cpp_data(emoji_filename, emoji_timestamp, "Extended_Pictographic", emoji_ranges)
     return "\n".join([gpb_cpp_data, emoji_cpp_data])
 
 
 if __name__ == "__main__":
-    print(MSVC_FORMAT_UCD_TABLES_HPP_TEMPLATE.lstrip().format(content=generate_data_tables()))
+    print(MSVC_FORMAT_UCD_TABLES_HPP_TEMPLATE.format(content=generate_data_tables()))